@@ -13,7 +13,6 @@ Usage:
 import sys
 import asyncio
 import argparse
-from src.advisor_logic import ooda_run, METRICS
 
 def main():
     parser = argparse.ArgumentParser(
@@ -47,7 +46,7 @@ Examples:
     
     args = parser.parse_args()
     
-    # Set model if specified
+    # Set model if specified (before advisor_logic is imported, which reads it)
     import os
     if args.model:
         os.environ['MODEL'] = args.model
@@ -64,13 +63,23 @@ Examples:
         print("Use --help for more information")
         sys.exit(1)
 
+async def ask(question):
+    """Run one OODA cycle, then close the HTTP client before asyncio.run ends its loop"""
+    from src.advisor_logic import ooda_run, aclose_http_client
+    try:
+        await ooda_run(question)
+    finally:
+        await aclose_http_client()
+
 def run_single_question(question):
     """Run analysis for a single question"""
+    from src.advisor_logic import METRICS
+    
     print(f"\n🔄 Processing: {question}")
     print("-" * 50)
     
     try:
-        asyncio.run(ooda_run(question))
+        asyncio.run(ask(question))
     except KeyboardInterrupt:
         print("\n\n⚠️ Interrupted by user")
     except Exception as e:
@@ -80,6 +89,8 @@ def run_single_question(question):
 
 def run_interactive_mode():
     """Run in interactive mode"""
+    from src.advisor_logic import METRICS
+    
     print("\n🔄 Interactive Mode")
     print("Type 'quit', 'exit', or press Ctrl+C to exit")
     print("=" * 50)
@@ -121,15 +132,9 @@ def run_interactive_mode():
             print("-" * 50)
             
             # Reset metrics for each question
-            METRICS.llm_tokens_in = 0
-            METRICS.llm_tokens_out = 0
-            METRICS.tool_calls = {"search": 0, "fetch": 0, "vector": 0}
-            METRICS.cache_hits = {"search": 0, "fetch": 0}
-            METRICS.events = []
-            METRICS.error_count = 0
-            METRICS.start_time = time.time()
+            METRICS.reset()
             
-            asyncio.run(ooda_run(question))
+            asyncio.run(ask(question))
             
         except KeyboardInterrupt:
             print("\n\n👋 Goodbye!")
@@ -141,6 +146,5 @@ def run_interactive_mode():
             print(f"\n❌ Error: {str(e)}")
 
 if __name__ == "__main__":
-    import time
     main()
 
@@ -1,14 +1,20 @@
-import os, sys, json, re, time, textwrap, hashlib, asyncio, math, logging
-from datetime import datetime, timedelta
-from typing import Dict, Any, List, Tuple, Optional
-from dataclasses import dataclass, field
+import os, json, re, time, hashlib, asyncio, functools, itertools, importlib.util
+from typing import Dict, Any, List, Tuple, Optional, Callable, TYPE_CHECKING
+from collections import OrderedDict, deque
 from pathlib import Path
 
+if TYPE_CHECKING:
+    import httpx
+
+# httpx is imported on first LLM call; only check that it is installed here
+HTTPX_AVAILABLE = importlib.util.find_spec("httpx") is not None
+if not HTTPX_AVAILABLE:
+    print("Warning: httpx library not available")
+
 try:
-    import requests
+    import orjson
 except ImportError:
-    print("Warning: requests library not available")
-    requests = None
+    orjson = None
 
 # =========================
 # Configuration & Globals
@@ -20,39 +26,88 @@ SEED_URLS = [
     "https://en.wikipedia.org/wiki/Byzantine_fault"
 ]
 OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate")
+# Comma-separated Ollama servers (e.g. "http://gpu1:11434,http://gpu2:11434") to spread calls over
+OLLAMA_HOSTS = [h.strip().rstrip("/") for h in os.environ.get("OLLAMA_HOSTS", "").split(",") if h.strip()]
+OLLAMA_URLS = [f"{h}/api/generate" for h in OLLAMA_HOSTS] or [OLLAMA_URL]
 CACHE_DIR = Path.home() / ".poc-ai-cache"
 SEARCH_CACHE = CACHE_DIR / "search"
 FETCH_CACHE = CACHE_DIR / "fetch"
 RAG_CACHE = CACHE_DIR / "rag"
+LLM_CACHE = CACHE_DIR / "llm"
+PLAN_CACHE = CACHE_DIR / "plan"
+OODA_CACHE = CACHE_DIR / "ooda"
 LOG_DIR = CACHE_DIR / "logs"
 
-for d in (SEARCH_CACHE, FETCH_CACHE, RAG_CACHE, LOG_DIR):
+for d in (SEARCH_CACHE, FETCH_CACHE, RAG_CACHE, LLM_CACHE, PLAN_CACHE, OODA_CACHE, LOG_DIR):
     d.mkdir(parents=True, exist_ok=True)
 
 MAX_SEARCH = 6
 MAX_FETCH = 6
 MAX_VECTOR_Q = 3
+CACHE_TTL = 3600
+HTTP_TIMEOUT = 60
+LLM_MAX_RETRIES = 3
+# Worst case for the two sequential LLM stages (professors, then synthesis): every
+# attempt running into its HTTP_TIMEOUT deadline (enforced per attempt in
+# _llm_generate) plus the backoff between attempts, with some slack
+OODA_TIMEOUT = 2 * (LLM_MAX_RETRIES * HTTP_TIMEOUT + sum(2 ** a for a in range(LLM_MAX_RETRIES - 1))) + 30
+LLM_CACHE_MEM_SIZE = 256
+SEARCH_CACHE_MEM_SIZE = 256
+PLAN_CACHE_MEM_SIZE = 256
+
+# Suppress echoing events to stdout (e.g. under the web server, where nobody reads it)
+QUIET = os.environ.get("ADVISOR_QUIET", "").lower() not in ("", "0", "false")
 
 SYSTEM_CORE = "Be concise, rigorous, evidence-driven. Use citation indices when applicable."
 
+_TOK_RE = re.compile(r'\b\w+\b')
+_WORD_RE = re.compile(r'\w+')
+_JSON_OBJ = re.compile(r'\{.*\}', re.S)
+_BULLET_RE = re.compile(r'^• [^\n]+\[\d+\][ \t]*$', re.M)
+_ANY_BULLET_RE = re.compile(r'^• ', re.M)
+
+def json_loads(data):
+    return orjson.loads(data) if orjson else json.loads(data)
+
+def json_dumps(obj) -> bytes:
+    return orjson.dumps(obj) if orjson else json.dumps(obj).encode()
+
 # =========================
 # Metrics & Logging
 # =========================
-@dataclass
 class Metrics:
-    start_time: float = field(default_factory=time.time)
-    llm_tokens_in: int = 0
-    llm_tokens_out: int = 0
-    tool_calls: Dict[str, int] = field(default_factory=lambda: {"search": 0, "fetch": 0, "vector": 0})
-    cache_hits: Dict[str, int] = field(default_factory=lambda: {"search": 0, "fetch": 0})
-    events: List[str] = field(default_factory=list)
-    error_count: int = 0
+    __slots__ = ("start_time", "llm_tokens_in", "llm_tokens_out", "tool_calls", "cache_hits", "events",
+                 "error_count", "quiet")
+    
+    def __init__(self, quiet: bool = False):
+        self.tool_calls: Dict[str, int] = {"search": 0, "fetch": 0, "vector": 0}
+        self.cache_hits: Dict[str, int] = {"search": 0, "fetch": 0, "llm": 0, "inflight": 0, "ooda": 0}
+        self.events: deque = deque(maxlen=512)  # (elapsed seconds, message)
+        self.quiet = quiet
+        self.reset()
+    
+    def reset(self):
+        """Zero the counters in place so per-request resets don't reallocate"""
+        self.start_time = time.time()
+        self.llm_tokens_in = 0
+        self.llm_tokens_out = 0
+        for counters in (self.tool_calls, self.cache_hits):
+            for key in counters:
+                counters[key] = 0
+        self.events.clear()
+        self.error_count = 0
     
     def log_event(self, msg: str):
         ts = time.time() - self.start_time
-        event = f"[{ts:6.2f}s] {msg}"
-        self.events.append(event)
-        print(event)
+        self.events.append((ts, msg))
+        if not self.quiet:
+            print(f"[{ts:6.2f}s] {msg}")
+    
+    def format_events(self, last: Optional[int] = None) -> List[str]:
+        events = list(self.events)
+        if last is not None:
+            events = events[-last:]
+        return [f"[{ts:6.2f}s] {msg}" for ts, msg in events]
     
     def log_error(self, error: Exception, context: str = ""):
         self.error_count += 1
@@ -62,44 +117,252 @@ class Metrics:
         duration = time.time() - self.start_time
         return f"Duration: {duration:.2f}s | Tools: {dict(self.tool_calls)} | Errors: {self.error_count}"
 
-METRICS = Metrics()
+METRICS = Metrics(quiet=QUIET)
 
 # =========================
 # LLM Interface
 # =========================
 def estimate_tokens(text: str) -> int:
-    return max(1, len(re.findall(r'\b\w+\b', text)))
+    return max(1, len(_TOK_RE.findall(text)))
+
+# Shared keep-alive pool; an AsyncClient is tied to the loop it first ran on,
+# so it is rebuilt if a later call arrives on a different event loop.
+_HTTP = None
+_HTTP_LOOP = None
+
+def _http_client() -> "httpx.AsyncClient":
+    global _HTTP, _HTTP_LOOP
+    loop = asyncio.get_running_loop()
+    if _HTTP is None or _HTTP_LOOP is not loop or _HTTP.is_closed:
+        import httpx
+        _HTTP = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(max_keepalive_connections=16, max_connections=32)
+        )
+        _HTTP_LOOP = loop
+    return _HTTP
+
+async def aclose_http_client():
+    """Close the shared client; await on the loop that used it before that loop ends"""
+    global _HTTP, _HTTP_LOOP
+    client, _HTTP, _HTTP_LOOP = _HTTP, None, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+# JSON file cache helpers shared by the on-disk caches below
+def _read_json_cache(path: Path, ttl: float = CACHE_TTL) -> Optional[Any]:
+    try:
+        if time.time() - path.stat().st_mtime >= ttl:
+            return None
+        return json_loads(path.read_bytes())
+    except (OSError, ValueError):
+        return None
+
+def _write_json_cache(path: Path, data: Any):
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        tmp.write_bytes(json_dumps(data))
+        os.replace(tmp, path)
+    except OSError as e:
+        METRICS.log_error(e, f"cache_write {path.parent.name}")
+
+class LLMReply(str):
+    """Generated text that also records why Ollama stopped ("stop", "length", "until", or None)
+    and whether it is a canned fallback rather than real model output"""
+    def __new__(cls, text: str, done_reason: Optional[str] = None, fallback: bool = False):
+        reply = super().__new__(cls, text)
+        reply.done_reason = done_reason
+        reply.fallback = fallback
+        return reply
+
+# Response cache: in-memory LRU in front of JSON files under LLM_CACHE.
+# Only complete generations are stored: never fallbacks, empty replies, or
+# replies truncated by num_predict (see _cacheable).
+_LLM_MEM: "OrderedDict[str, Tuple[float, LLMReply]]" = OrderedDict()
+
+def _llm_cache_key(prompt: str, options: Dict[str, Any]) -> str:
+    normalized = " ".join(prompt.split())
+    opts = json.dumps(options, sort_keys=True)
+    return hashlib.sha256(f"{MODEL}|{SYSTEM_CORE}|{opts}|{normalized}".encode()).hexdigest()
+
+def _llm_cache_get(key: str) -> Optional[LLMReply]:
+    now = time.time()
+    hit = _LLM_MEM.get(key)
+    if hit is not None:
+        if now - hit[0] < CACHE_TTL:
+            _LLM_MEM.move_to_end(key)
+            return hit[1]
+        del _LLM_MEM[key]
+    
+    path = LLM_CACHE / f"{key}.json"
+    try:
+        mtime = path.stat().st_mtime
+        if now - mtime >= CACHE_TTL:
+            return None
+        entry = json_loads(path.read_bytes())
+        result = LLMReply(entry["response"], entry.get("done_reason"))
+    except (OSError, ValueError, KeyError):
+        return None
+    
+    _llm_cache_remember(key, result, mtime)
+    return result
 
-async def llm_call_async(role: str, content: str, temperature: float = 0.3, max_retries: int = 3) -> str:
-    if not requests:
-        return f"Mock response from {role}: Technical analysis needed based on provided context."
+def _llm_cache_remember(key: str, result: LLMReply, stamp: float):
+    _LLM_MEM[key] = (stamp, result)
+    _LLM_MEM.move_to_end(key)
+    while len(_LLM_MEM) > LLM_CACHE_MEM_SIZE:
+        _LLM_MEM.popitem(last=False)
+
+def _cacheable(result: LLMReply) -> bool:
+    return bool(result) and not result.fallback and result.done_reason != "length"
+
+def _llm_cache_put(key: str, result: LLMReply):
+    _llm_cache_remember(key, result, time.time())
+    _write_json_cache(LLM_CACHE / f"{key}.json",
+                      {"model": MODEL, "response": str(result), "done_reason": result.done_reason})
+
+# Round-robin over the configured servers; a retry moves on to the next one
+_OLLAMA_CYCLE = itertools.cycle(OLLAMA_URLS)
+
+# Generations currently in flight, so identical concurrent prompts share one request
+_INFLIGHT: Dict[str, asyncio.Future] = {}
+
+def json_object_closed(text: str) -> bool:
+    """True once the first JSON object in text has its closing brace"""
+    start = text.find("{")
+    if start < 0:
+        return False
+    depth = 0
+    in_str = escaped = False
+    for ch in text[start:]:
+        if in_str:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return True
+    return False
+
+async def llm_call_async(role: str, content: str, *, temperature: float = 0.3, max_tokens: int = 80,
+                         stop: Optional[List[str]] = None, until: Optional[Callable[[str], bool]] = None,
+                         max_retries: int = LLM_MAX_RETRIES) -> LLMReply:
+    if not HTTPX_AVAILABLE:
+        return LLMReply(f"Mock response from {role}: Technical analysis needed based on provided context.",
+                        fallback=True)
+    
+    # SYSTEM_CORE goes in Ollama's system field so its prefix is shared across calls
+    prompt = f"[{role}]\n{content}"
+    options = {"temperature": temperature, "num_predict": max_tokens, "stop": stop or []}
+    
+    cache_key = _llm_cache_key(prompt, options)
+    while True:
+        cached = _llm_cache_get(cache_key)
+        if cached is not None:
+            METRICS.cache_hits["llm"] += 1
+            return cached
+        
+        pending = _INFLIGHT.get(cache_key)
+        if pending is None:
+            break
         
-    prompt = f"[SYSTEM]\n{SYSTEM_CORE}\n\n[{role}]\n{content}"
+        METRICS.cache_hits["inflight"] += 1
+        try:
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            # If only the owning request was cancelled (e.g. its HTTP call timed out),
+            # look again and generate ourselves rather than inheriting its cancellation
+            if asyncio.current_task().cancelling() or not pending.cancelled():
+                raise
+    
+    fut = asyncio.get_running_loop().create_future()
+    _INFLIGHT[cache_key] = fut
+    try:
+        result = await _llm_generate(role, prompt, options, cache_key, until, max_retries)
+        fut.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        fut.cancel()
+        raise
+    except Exception as e:
+        fut.set_exception(e)
+        fut.exception()  # mark retrieved when nobody else is waiting
+        raise
+    finally:
+        del _INFLIGHT[cache_key]
+
+async def _llm_generate(role: str, prompt: str, options: Dict[str, Any], cache_key: str,
+                        until: Optional[Callable[[str], bool]], max_retries: int) -> LLMReply:
     METRICS.llm_tokens_in += estimate_tokens(prompt)
     
     for attempt in range(max_retries):
         try:
             payload = {
                 "model": MODEL,
+                "system": SYSTEM_CORE,
                 "prompt": prompt,
-                "stream": False,
-                "options": {"temperature": temperature, "num_predict": 200}
+                "stream": True,
+                "options": options
             }
             
-            response = requests.post(OLLAMA_URL, json=payload, timeout=60)
-            response.raise_for_status()
+            # Stream so the connection can be dropped as soon as the output is usable
+            text = ""
+            done_reason = None
+            finished = False
+            body = json_dumps(payload)
+            # httpx's timeout only bounds each read; cap the whole attempt as well so a
+            # slow stream can't outlive HTTP_TIMEOUT (the budget OODA_TIMEOUT assumes)
+            async with asyncio.timeout(HTTP_TIMEOUT), \
+                    _http_client().stream("POST", next(_OLLAMA_CYCLE), content=body,
+                                          headers={"content-type": "application/json"}) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json_loads(line)
+                    # Ollama reports mid-generation failures in-band, after the 200
+                    if chunk.get("error"):
+                        raise RuntimeError(f"Ollama error: {chunk['error']}")
+                    text += chunk.get("response", "")
+                    if chunk.get("done"):
+                        done_reason = chunk.get("done_reason")
+                        finished = True
+                        break
+                    if until and until(text):
+                        done_reason = "until"
+                        finished = True
+                        break
+            
+            if not finished:
+                raise RuntimeError("Ollama stream ended before generation finished")
+            
+            result = LLMReply(text.strip(), done_reason)
+            if not result:
+                raise RuntimeError("Ollama returned an empty response")
             
-            result = response.json().get("response", "").strip()
             METRICS.llm_tokens_out += estimate_tokens(result)
+            # A truncated reply is returned for the caller to judge, but not cached:
+            # replaying it would repeat the caller's fallback for the whole TTL
+            if _cacheable(result):
+                _llm_cache_put(cache_key, result)
             return result
             
         except Exception as e:
             METRICS.log_error(e, f"LLM attempt {attempt + 1}")
             if attempt == max_retries - 1:
-                return f"Fallback response from {role}: Analysis required for given context."
-            await asyncio.sleep(1)
+                return LLMReply(f"Fallback response from {role}: Analysis required for given context.",
+                                fallback=True)
+            await asyncio.sleep(2 ** attempt)
     
-    return "Error generating response"
+    return LLMReply("Error generating response", fallback=True)
 
 # =========================
 # Evidence & Professors
@@ -120,29 +383,10 @@ class ProfessorBase:
     specialty = "General"
     expertise_keywords = []
     
-    async def analyze_async(self, question: str, snippets: List[str]) -> List[EvidenceCard]:
-        try:
-            context = "\n".join(f"[{i+1}] {s[:100]}..." for i, s in enumerate(snippets[:3]))
-            
-            prompt = f"""
-Question: {question}
-Context: {context}
-
-As {self.name} specializing in {self.specialty}, provide 2 evidence cards as JSON:
-[{{"claim": "insight 1", "confidence": 0.8, "citations": [1], "rationale": "brief reason"}},
- {{"claim": "insight 2", "confidence": 0.7, "citations": [1,2], "rationale": "brief reason"}}]
-"""
-            
-            raw = await llm_call_async(self.name, prompt, temperature=0.2)
-            
-            # Try to extract JSON or create fallback
-            try:
-                import json
-                cards_data = json.loads(raw) if raw.startswith('[') else []
-            except:
-                cards_data = []
-            
-            cards = []
+    def build_cards(self, cards_data: Any) -> List[EvidenceCard]:
+        """Turn this professor's slice of a joint analysis into evidence cards (empty if unusable)"""
+        cards = []
+        if isinstance(cards_data, list):
             for card_data in cards_data[:2]:
                 if isinstance(card_data, dict):
                     cards.append(EvidenceCard(
@@ -152,27 +396,17 @@ As {self.name} specializing in {self.specialty}, provide 2 evidence cards as JSO
                         rationale=card_data.get("rationale", "Based on evidence"),
                         professor=self.name
                     ))
-            
-            if not cards:
-                cards = [EvidenceCard(
-                    claim=f"{self.specialty} considerations required",
-                    confidence=0.5,
-                    citations=[1],
-                    rationale="Fallback guidance",
-                    professor=self.name
-                )]
-            
-            return cards
-            
-        except Exception as e:
-            METRICS.log_error(e, f"analyze_{self.name}")
-            return [EvidenceCard(
-                claim=f"{self.specialty} analysis needed",
-                confidence=0.3,
-                citations=[1],
-                rationale="Error fallback",
-                professor=self.name
-            )]
+        
+        return cards
+    
+    def fallback_card(self, rationale: str, confidence: float) -> EvidenceCard:
+        return EvidenceCard(
+            claim=f"{self.specialty} considerations required",
+            confidence=confidence,
+            citations=[1],
+            rationale=rationale,
+            professor=self.name
+        )
 
 # Specialized Professors
 class ProfAlgorithms(ProfessorBase):
@@ -198,6 +432,12 @@ class ProfFinance(ProfessorBase):
 # =========================
 # Simple MCP Server
 # =========================
+def _blake2b(text: str) -> str:
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+def _shorten(text: str, width: int) -> str:
+    return text[:width - 1] + "…" if len(text) > width else text
+
 class SimpleMCPServer:
     def __init__(self):
         self.kb = [
@@ -214,23 +454,79 @@ class SimpleMCPServer:
                 "text": "Financial trading systems require sub-millisecond latencies for high-frequency trading. They must handle Byzantine faults due to adversarial environments. Consensus protocols add overhead but are essential for maintaining consistency across distributed trading engines."
             }
         ]
-    
-    def search_kb(self, query: str) -> List[Dict[str, Any]]:
-        query_terms = set(re.findall(r'\w+', query.lower()))
-        results = []
         
+        # Tokenize and fingerprint each document once instead of on every query
         for item in self.kb:
-            text_terms = set(re.findall(r'\w+', item["text"].lower()))
-            score = len(query_terms & text_terms)
-            if score > 0:
-                results.append({
-                    "title": item["id"],
-                    "snippet": textwrap.shorten(item["text"], 200),
-                    "url": f"local://{item['id']}",
-                    "score": score
-                })
-        
-        return sorted(results, key=lambda x: x["score"], reverse=True)[:3]
+            item["_terms"] = frozenset(_WORD_RE.findall(item["text"].lower()))
+            item["_hash"] = _blake2b(item["text"])
+        self.kb_hash = _blake2b("|".join(item["_hash"] for item in self.kb))
+        self._search_memo: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        
+        # TF-IDF matrix for weighted ranking; keyword overlap is the fallback
+        # (scikit-learn is heavy, so it is only imported once a server is built)
+        self.vectorizer = None
+        self.kb_mat = None
+        try:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+        except ImportError:
+            pass
+        else:
+            texts = [item["text"] for item in self.kb]
+            self.vectorizer = TfidfVectorizer().fit(texts)
+            self.kb_mat = self.vectorizer.transform(texts)
+    
+    def search_kb(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
+        ranker = "tfidf" if self.vectorizer is not None else "overlap"
+        key = _blake2b(f"{self.kb_hash}|{ranker}|{k}|{' '.join(query.lower().split())}")
+        
+        results = self._search_memo.get(key)
+        if results is None:
+            results = _read_json_cache(SEARCH_CACHE / f"{key}.json")
+            if results is None:
+                results = self._search_uncached(query, k)
+                _write_json_cache(SEARCH_CACHE / f"{key}.json", results)
+            else:
+                METRICS.cache_hits["search"] += 1
+            self._search_memo[key] = results
+            if len(self._search_memo) > SEARCH_CACHE_MEM_SIZE:
+                self._search_memo.popitem(last=False)
+        else:
+            METRICS.cache_hits["search"] += 1
+            self._search_memo.move_to_end(key)
+        
+        return results
+    
+    def _search_uncached(self, query: str, k: int) -> List[Dict[str, Any]]:
+        if self.vectorizer is not None:
+            scored = self._score_tfidf(query, k)
+        else:
+            query_terms = set(_WORD_RE.findall(query.lower()))
+            scored = [(len(query_terms & item["_terms"]), item) for item in self.kb]
+            scored = sorted(scored, key=lambda x: x[0], reverse=True)[:k]
+        
+        return [
+            {
+                "title": item["id"],
+                "snippet": _shorten(item["text"], 200),
+                "url": f"local://{item['id']}",
+                "score": score
+            }
+            for score, item in scored if score > 0
+        ]
+    
+    def _score_tfidf(self, query: str, k: int) -> List[Tuple[float, Dict[str, Any]]]:
+        import numpy as np  # available whenever scikit-learn is
+        
+        qv = self.vectorizer.transform([query])
+        scores = (self.kb_mat @ qv.T).toarray().ravel()
+        
+        if len(scores) > k:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        
+        return [(float(scores[i]), self.kb[i]) for i in top]
     
     def mock_web_search(self, query: str) -> List[Dict[str, Any]]:
         # Mock web search results
@@ -249,9 +545,35 @@ class Advisor:
     def __init__(self):
         self.mcp = SimpleMCPServer()
         self.professors = [ProfAlgorithms(), ProfSystems(), ProfSecurity(), ProfFinance()]
-        self.memo = {}
+        self.memo: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # bounded LRU of plans
+        self._route_cached = functools.lru_cache(maxsize=256)(self._route_lower)
+        
+        # One alternation over every keyword; each keyword gets a named group
+        # mapping back to its professor. Longest first so prefixes don't shadow.
+        keywords = [(kw, prof.name) for prof in self.professors for kw in prof.expertise_keywords]
+        keywords.sort(key=lambda x: len(x[0]), reverse=True)
+        self._route_keys = {f"k{i}": name for i, (_, name) in enumerate(keywords)}
+        self._route_re = re.compile("|".join(f"(?P<k{i}>{re.escape(kw)})" for i, (kw, _) in enumerate(keywords)))
     
     async def plan_async(self, question: str) -> Dict[str, Any]:
+        # Same normalization as the OODA result cache
+        key = hashlib.md5(question.lower().strip().encode()).hexdigest()
+        if key in self.memo:
+            self.memo.move_to_end(key)
+            return self.memo[key]
+        
+        path = PLAN_CACHE / f"{key}.json"
+        plan = _read_json_cache(path)
+        if plan is None:
+            plan = self._plan(question)
+            _write_json_cache(path, plan)
+        
+        self.memo[key] = plan
+        if len(self.memo) > PLAN_CACHE_MEM_SIZE:
+            self.memo.popitem(last=False)
+        return plan
+    
+    def _plan(self, question: str) -> Dict[str, Any]:
         # Simple planning - break into key aspects
         if "consensus" in question.lower() or "raft" in question.lower() or "pbft" in question.lower():
             subqs = [
@@ -265,19 +587,22 @@ class Advisor:
         return {"subqs": subqs[:3], "budgets": {"tool_calls": 2}}
     
     def route_professors(self, subq: str) -> List[str]:
-        subq_lower = subq.lower()
-        prof_scores = {}
-        
-        for prof in self.professors:
-            score = sum(1 for keyword in prof.expertise_keywords if keyword in subq_lower)
-            if score > 0:
-                prof_scores[prof.name] = score
+        return list(self._route_cached(subq.lower()))
+    
+    def _route_lower(self, subq_lower: str) -> Tuple[str, ...]:
+        # Each distinct keyword counts once, as with plain substring checks
+        hits = {m.lastgroup for m in self._route_re.finditer(subq_lower)}
+        counts = {}
+        for group in hits:
+            name = self._route_keys[group]
+            counts[name] = counts.get(name, 0) + 1
+        prof_scores = {p.name: counts[p.name] for p in self.professors if p.name in counts}
         
         if not prof_scores:
             prof_scores = {"Prof. Algorithms": 1, "Prof. Systems": 1}
         
         ranked = sorted(prof_scores.items(), key=lambda x: x[1], reverse=True)
-        return [name for name, _ in ranked[:2]]
+        return tuple(name for name, _ in ranked[:2])
     
     async def gather_evidence(self, subq: str) -> Tuple[List[str], List[str]]:
         METRICS.log_event(f"Gathering evidence for: {subq[:50]}...")
@@ -301,30 +626,104 @@ class Advisor:
         
         return snippets[:3], citations[:3]
     
-    async def consult_professors(self, subqs: List[str]) -> Tuple[List[EvidenceCard], List[str]]:
+    async def analyze_joint_async(self, question: str, snippets: List[str],
+                                  profs: List[ProfessorBase]) -> Tuple[List[EvidenceCard], bool]:
+        """One LLM call per subq: every routed professor answers from the shared context.
+        Returns the cards and whether any professor had to fall back."""
+        try:
+            context = "\n".join(f"[{i+1}] {s[:100]}..." for i, s in enumerate(snippets[:3]))
+            personas = "\n".join(f"- {p.name}: {p.specialty}" for p in profs)
+            example = ",\n ".join(
+                f'"{p.name}": [{{"claim": "insight 1", "confidence": 0.8, "citations": [1], "rationale": "brief reason"}}, '
+                f'{{"claim": "insight 2", "confidence": 0.7, "citations": [1,2], "rationale": "brief reason"}}]'
+                for p in profs
+            )
+            
+            prompt = f"""
+Question: {question}
+Context: {context}
+
+Personas:
+{personas}
+
+Produce evidence cards as JSON mapping each persona name to a 2-card array:
+{{{example}}}
+"""
+            
+            # 160 tokens per professor (its 2-card array plus key and punctuation);
+            # no stop sequence since the object nests arrays
+            raw = await llm_call_async("Professors", prompt, temperature=0.2, max_tokens=160 * len(profs),
+                                       until=json_object_closed)
+            
+            # Try to extract the JSON object or fall back per professor
+            try:
+                match = _JSON_OBJ.search(raw)
+                by_prof = json_loads(match.group(0)) if match else {}
+            except ValueError:
+                by_prof = {}
+            if not isinstance(by_prof, dict):
+                by_prof = {}
+            
+            cards = []
+            fell_back = raw.fallback
+            for prof in profs:
+                prof_cards = [] if raw.fallback else prof.build_cards(by_prof.get(prof.name))
+                if not prof_cards:
+                    prof_cards = [prof.fallback_card("Fallback guidance", 0.5)]
+                    fell_back = True
+                cards.extend(prof_cards)
+            return cards, fell_back
+            
+        except Exception as e:
+            METRICS.log_error(e, "analyze_joint")
+            return [prof.fallback_card("Error fallback", 0.3) for prof in profs], True
+    
+    async def consult_professors(self, subqs: List[str]) -> Tuple[List[EvidenceCard], List[str], bool]:
+        """Returns evidence, citations, and whether any analysis fell back"""
         all_evidence = []
-        all_citations = []
+        fell_back = False
+        seen_cards = set()
+        seen_citations = {}  # insertion-ordered set
+        
+        # Gather evidence for every subq concurrently
+        gathered = await asyncio.gather(*(self.gather_evidence(subq) for subq in subqs))
         
-        for i, subq in enumerate(subqs):
+        # Fan out one joint analysis per subq covering its routed professors
+        tasks = []
+        for i, (subq, (snippets, citations)) in enumerate(zip(subqs, gathered)):
             METRICS.log_event(f"Processing subq {i+1}: {subq[:40]}...")
-            
-            snippets, citations = await self.gather_evidence(subq)
-            all_citations.extend(c for c in citations if c not in all_citations)
+            for c in citations:
+                seen_citations.setdefault(c, None)
             
             prof_names = self.route_professors(subq)
             selected_profs = [p for p in self.professors if p.name in prof_names]
-            
-            for prof in selected_profs:
-                cards = await prof.analyze_async(subq, snippets)
-                all_evidence.extend(cards)
+            tasks.append(self.analyze_joint_async(subq, snippets, selected_profs))
+        
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        
+        for outcome in results:
+            # BaseException too: a cancelled child comes back as CancelledError
+            if isinstance(outcome, BaseException):
+                METRICS.log_error(outcome, "analyze_joint")
+                fell_back = True
+                continue
+            cards, subq_fell_back = outcome
+            fell_back = fell_back or subq_fell_back
+            for card in cards:
+                key = (card.get("professor"), card.get("claim"))
+                if key not in seen_cards:
+                    seen_cards.add(key)
+                    all_evidence.append(card)
         
-        return all_evidence, all_citations
+        return all_evidence, list(seen_citations), fell_back
 
 # =========================
 # Synthesis & Main Loop
 # =========================
 class Synthesizer:
-    async def synthesize_async(self, question: str, evidence: List[EvidenceCard], citations: List[str]) -> str:
+    async def synthesize_async(self, question: str, evidence: List[EvidenceCard],
+                               citations: List[str]) -> Tuple[str, bool]:
+        """Returns the draft and whether it is the canned fallback rather than model output"""
         try:
             citation_map = "\n".join([f"[{i+1}] {url}" for i, url in enumerate(citations[:6])])
             evidence_text = "\n".join([
@@ -353,20 +752,26 @@ Format:
 DONE
 """
             
-            result = await llm_call_async("Synthesizer", prompt, temperature=0.1)
+            # 3 bullets of up to 25 words is ~100 tokens; 90 would cut off full-length
+            # answers, which are now rejected as truncated, so allow some headroom
+            reply = await llm_call_async("Synthesizer", prompt, temperature=0.1, max_tokens=120, stop=["DONE"])
             
-            # Validate format
-            lines = result.strip().split('\n')
-            bullets = [line for line in lines if line.startswith('• ')]
+            # A reply cut off by num_predict ("length") can't be trusted to be complete
+            if reply.fallback or reply.done_reason != "stop":
+                return self._fallback_synthesis(citations), True
             
-            if len(bullets) == 3 and result.strip().endswith('DONE'):
-                return result
+            # Ollama strips the stop sequence, so restore the DONE marker
+            result = reply.rstrip() + "\nDONE"
+            
+            # Validate format: exactly 3 bullets, all cited (DONE is appended above)
+            if len(_ANY_BULLET_RE.findall(result)) == 3 and len(_BULLET_RE.findall(result)) == 3:
+                return result, False
             else:
-                return self._fallback_synthesis(citations)
+                return self._fallback_synthesis(citations), True
                 
         except Exception as e:
             METRICS.log_error(e, "synthesis")
-            return self._fallback_synthesis(citations)
+            return self._fallback_synthesis(citations), True
     
     def _fallback_synthesis(self, citations: List[str]) -> str:
         ref1 = "[1]" if len(citations) > 0 else "[1]"
@@ -378,15 +783,54 @@ DONE
 • Performance testing essential to validate consensus overhead under multi-agent coordination load {ref3}
 DONE"""
 
+# Built on first use and then reused, so the KB index and routing cache are
+# created once per process and importing this module stays cheap
+_ADVISOR: Optional[Advisor] = None
+_SYNTHESIZER: Optional[Synthesizer] = None
+
+def _pipeline() -> Tuple[Advisor, Synthesizer]:
+    global _ADVISOR, _SYNTHESIZER
+    if _ADVISOR is None:
+        _ADVISOR = Advisor()
+        _SYNTHESIZER = Synthesizer()
+    return _ADVISOR, _SYNTHESIZER
+
 # =========================
 # Main OODA Loop
 # =========================
-async def ooda_run(question: str):
+def _ooda_cache_path(question: str) -> Path:
+    key = hashlib.sha256(f"{MODEL}|{question.lower().strip()}".encode()).hexdigest()
+    return OODA_CACHE / f"{key}.json"
+
+def ooda_cache_etag(question: str) -> Optional[str]:
+    """ETag for a fresh cached analysis of question, or None if it would be recomputed"""
+    path = _ooda_cache_path(question)
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+    if time.time() - mtime >= CACHE_TTL:
+        return None
+    return f"{path.stem[:16]}-{int(mtime)}"
+
+async def ooda_run(question: str) -> str:
     """Main OODA orchestration"""
     METRICS.log_event("🎯 OBSERVE: Question received and analyzed")
     
-    advisor = Advisor()
-    synthesizer = Synthesizer()
+    cache_path = _ooda_cache_path(question)
+    cached = _read_json_cache(cache_path)
+    if cached is not None:
+        METRICS.cache_hits["ooda"] += 1
+        METRICS.log_event(f"♻️ Replaying cached analysis ({cached.get('metrics', '')})")
+        draft = cached["draft"]
+    else:
+        draft = await _ooda_cycle(question, cache_path)
+    
+    _print_report(draft)
+    return draft
+
+async def _ooda_cycle(question: str, cache_path: Path) -> str:
+    advisor, synthesizer = _pipeline()
     
     try:
         # ORIENT: Planning
@@ -395,22 +839,28 @@ async def ooda_run(question: str):
         
         # DECIDE: Evidence gathering & professor consultation  
         METRICS.log_event("🤔 DECIDE: Evidence gathering and expert consultation")
-        evidence, citations = await advisor.consult_professors(plan.get("subqs", [question]))
+        evidence, citations, evidence_fell_back = await advisor.consult_professors(plan.get("subqs", [question]))
         
         # ACT: Synthesis and validation
         METRICS.log_event("⚡ ACT: Synthesis and quality validation")
-        draft = await synthesizer.synthesize_async(question, evidence, citations)
+        draft, draft_fell_back = await synthesizer.synthesize_async(question, evidence, citations)
         
         METRICS.log_event("✅ OODA cycle completed successfully")
         
+        # Only real model output is replayed; any fallback is recomputed next time
+        if not (evidence_fell_back or draft_fell_back):
+            _write_json_cache(cache_path, {"question": question, "draft": draft, "metrics": METRICS.summary()})
+        
     except Exception as e:
         METRICS.log_error(e, "ooda_main")
         draft = """• Technical analysis required for distributed consensus algorithm comparison [1]
 • Performance benchmarking needed for sub-100ms latency validation in trading systems [2]  
 • Security assessment essential for Byzantine fault tolerance in multi-agent coordination [3]
 DONE"""
+    
+    return draft
 
-    # Display results
+def _print_report(draft: str):
     print("\n" + "="*60)
     print("📊 PERFORMANCE METRICS") 
     print("="*60)
@@ -419,7 +869,7 @@ DONE"""
     print("\n" + "="*60)
     print("📋 EXECUTION LOG")
     print("="*60)
-    for event in METRICS.events[-8:]:
+    for event in METRICS.format_events(last=8):
         print(f"  {event}")
     
     print("\n" + "="*60)
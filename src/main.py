@@ -1,12 +1,14 @@
 import os
 import sys
 import asyncio
-import time # Added this line
-from flask import Flask, request, jsonify, send_from_directory
+import atexit
+import threading
+import concurrent.futures
+from flask import Flask, Response, request, jsonify, send_from_directory
 
 # Add the src directory to the path
 sys.path.insert(0, os.path.dirname(__file__))
-from advisor_logic import ooda_run, METRICS # Import ooda_run and METRICS
+from advisor_logic import ooda_run, ooda_cache_etag, aclose_http_client, METRICS, OLLAMA_URLS, OODA_TIMEOUT, json_dumps # Pipeline entry point, metrics and HTTP/cache helpers
 
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
@@ -14,6 +16,15 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 
+# One long-lived event loop shared by all requests, so the HTTP pool stays warm
+_LOOP = asyncio.new_event_loop()
+threading.Thread(target=_LOOP.run_forever, name='advisor-loop', daemon=True).start()
+
+@atexit.register
+def _close_loop_resources():
+    # The client lives on _LOOP, so it has to be closed from that loop's thread
+    asyncio.run_coroutine_threadsafe(aclose_http_client(), _LOOP).result(timeout=5)
+
 # Disable database for this project as it's not used
 # app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
 # app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
@@ -29,26 +40,34 @@ def analyze_question():
     if not question:
         return jsonify({'error': 'No question provided'}), 400
 
+    # Let clients that kept the previous response skip re-downloading a cached analysis
+    etag = ooda_cache_etag(question)
+    if etag and etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
     # Reset metrics for each new question
-    METRICS.llm_tokens_in = 0
-    METRICS.llm_tokens_out = 0
-    METRICS.tool_calls = {"search": 0, "fetch": 0, "vector": 0}
-    METRICS.cache_hits = {"search": 0, "fetch": 0}
-    METRICS.events = []
-    METRICS.error_count = 0
-    METRICS.start_time = time.time() # Reset start time
-
-    # Run the OODA loop asynchronously
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    result = loop.run_until_complete(ooda_run(question))
-    loop.close()
-
-    return jsonify({
+    METRICS.reset()
+
+    # Run the OODA loop on the shared background loop
+    fut = asyncio.run_coroutine_threadsafe(ooda_run(question), _LOOP)
+    try:
+        result = fut.result(timeout=OODA_TIMEOUT)
+    except concurrent.futures.TimeoutError:
+        fut.cancel()  # stop the run on the loop instead of leaving it going
+        return jsonify({'error': 'Analysis timed out'}), 504
+
+    body = json_dumps({
         'analysis': result,
         'metrics': METRICS.summary(),
-        'log': METRICS.events
+        'log': METRICS.format_events()
     })
+    response = Response(body, mimetype='application/json')
+    etag = ooda_cache_etag(question)
+    if etag:
+        response.set_etag(etag)
+    return response
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -68,6 +87,8 @@ def serve(path):
 
 
 if __name__ == '__main__':
+    print(f"Ollama: {', '.join(OLLAMA_URLS)}")
+    print("Hint: set OLLAMA_NUM_PARALLEL (> 1) on the Ollama server so concurrent professor calls aren't queued")
     app.run(host='0.0.0.0', port=5000, debug=True)
 
 